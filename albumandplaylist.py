@@ -5,15 +5,60 @@ import asyncio
 import argparse
 import logging
 import re
+import ntpath
+import heapq
+import gc
+import random
+import time
 from typing import Any
 from dotenv import load_dotenv
 from collections import defaultdict
 from aioslsk.client import SoulSeekClient
+from aioslsk.events import SearchResultEvent
 from aioslsk.settings import Settings, CredentialsSettings
 from aioslsk.transfer.model import Transfer
-from aioslsk.exceptions import ConnectionReadError
+from aioslsk.exceptions import AioSlskException, ConnectionReadError
 from mutagen import File as MutagenFile
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+    try:
+        # The C backend is many times faster than ijson's pure-Python one
+        ijson = ijson.get_backend("yajl2_c")
+    except ImportError:
+        pass
+except ImportError:
+    ijson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# Transfers allowed from a single peer at once
+PEER_SLOTS = 2
+# Seconds a search that came back empty is skipped before being retried, also across runs
+NEGATIVE_CACHE_TTL = 24 * 3600
+# Empty searches are remembered in the output directory under this name
+SEARCH_CACHE_FILE = ".search_cache.json"
+# Failures of one search or transfer that just mean moving on to the next peer
+DOWNLOAD_ERRORS = (AioSlskException, OSError, asyncio.TimeoutError, ValueError)
+# Index files above this size are streamed with ijson; smaller ones parse faster in one go
+STREAM_THRESHOLD = 50_000_000
+# Characters stripped by sanitize(); str.translate deletes them in one C-level pass
+_SANITIZE_TABLE = str.maketrans('', '', '\\/:*?"_<>|')
+_NORMALIZE_RE = re.compile(r"[^\w\s]")
+
 
 def getenv_safe(key: str) -> str:
     val = os.getenv(key)
@@ -22,212 +67,534 @@ def getenv_safe(key: str) -> str:
         sys.exit(1)
     return val
 
+def positive_int(value: str) -> int:
+    # argparse type for limits that need at least one slot to make progress
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
+
+def non_negative_int(value: str) -> int:
+    # argparse type for limits where 0 switches the feature off
+    n = int(value)
+    if n < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, got {n}")
+    return n
+
 def sanitize(text: str) -> str:
-    return re.sub(r'[\\/:*?"_<>|]', '', text)
+    return text.translate(_SANITIZE_TABLE)
 
 def normalize(s: str) -> str:
-    return re.sub(r"[^\w\s]", "", s).lower().strip()
+    return _NORMALIZE_RE.sub("", s).lower().strip()
+
+def load_json(raw: bytes):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def load_search_cache(path) -> dict[str, float]:
+    # Query -> wall-clock expiry; expired or unreadable entries are simply dropped
+    try:
+        with open(path, "rb") as f:
+            cache = load_json(f.read())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    now = time.time()
+    return {
+        query: expiry for query, expiry in cache.items()
+        if isinstance(expiry, (int, float)) and not isinstance(expiry, bool) and expiry > now
+    }
+
+def scan_outdir(outdir) -> dict[str, int]:
+    # One directory scan up front instead of a stat per track
+    with os.scandir(outdir) as entries:
+        return {e.name: e.stat().st_size for e in entries if e.is_file()}
+
+def save_search_cache(path, cache: dict[str, float]):
+    # Written to a temp file first so an interrupted run never leaves a truncated cache
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def iter_index(path):
+    # Yields (sid, info) pairs; large files are parsed incrementally with ijson and never held whole
+    with open(path, "rb") as f:
+        if ijson is not None and os.fstat(f.fileno()).st_size > STREAM_THRESHOLD:
+            yield from ijson.kvitems(f, "")
+        else:
+            yield from load_json(f.read()).items()
+
+def _peer_speed(result) -> int:
+    return result.avg_speed or 0
 
 def disable_aioslsk_logging():
-    for name in list(logging.root.manager.loggerDict.keys()):
-        if name.startswith("aioslsk"):
-            logging.getLogger(name).disabled = True
+    # Child loggers inherit the effective level, so this silences the whole package
+    # without scanning every registered logger
+    logger = logging.getLogger("aioslsk")
+    logger.disabled = True
+    logger.setLevel(logging.CRITICAL + 1)
+    logger.propagate = False
+
+
+class RateLimiter:
+    # Token bucket: bursts of up to `rate` requests, then a steady `rate` per second
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
 
 
 class Track:
-    def __init__(self, sid: str, info: dict[str, Any]):
+    __slots__ = ('sid', 'name', 'artist', 'album', 'album_source', 'playlists', 'label',
+                 'sanitized_name_lc', 'filename', 'dest')
+
+    def __init__(self, sid: str, info: dict[str, Any], outdir: str, ext: str):
         self.sid = sid
         self.name = info['name']
-        self.artist = info['artist']
-        self.album = info.get('album')
-        self.sources = info.get('sources', [])
-        self.album_source = any(s['type'] == 'album' for s in self.sources)
-        self.playlists = [s['playlist_name'] for s in self.sources if s['type'] == 'playlist']
+        # Album/artist/playlist names repeat across many tracks; intern them to share one copy
+        self.artist = sys.intern(info['artist'])
+        album = info.get('album')
+        self.album = sys.intern(album) if album is not None else None
+        self.album_source = False
+        self.playlists = []
+        for source in info.get('sources', ()):
+            if source['type'] == 'album':
+                self.album_source = True
+            elif source['type'] == 'playlist':
+                self.playlists.append(sys.intern(source['playlist_name']))
         self.label = f"{self.name} - {self.artist}"
+        self.sanitized_name_lc = self.name.translate(_SANITIZE_TABLE).lower()
+        self.filename = f"{sid}.{ext}"
+        self.dest = os.path.join(outdir, self.filename)
+
+
+class TrackMatcher:
+    # Multi-pattern matcher over sanitized track names; uses an Aho-Corasick
+    # automaton when pyahocorasick is installed, a linear scan otherwise
+    def __init__(self, tracks: list[Track]):
+        self.tracks = tracks
+        self.automaton = None
+        if ahocorasick is not None and tracks:
+            self.automaton = ahocorasick.Automaton()
+            for track in tracks:
+                key = track.sanitized_name_lc
+                if key in self.automaton:
+                    self.automaton.get(key).append(track)
+                else:
+                    self.automaton.add_word(key, [track])
+            self.automaton.make_automaton()
+
+    def match(self, text: str, exclude) -> Track | None:
+        if self.automaton is None:
+            return next((t for t in self.tracks if t.sid not in exclude and t.sanitized_name_lc in text), None)
+        for _, found in self.automaton.iter(text):
+            for track in found:
+                if track.sid not in exclude:
+                    return track
+        return None
 
 
 class Downloader:
-    def __init__(self, client, outdir, search_timeout, download_timeout, ext, min_filesize=1000, max_attempts=3, verbose=False):
+    def __init__(self, client, outdir, search_timeout, download_timeout, ext, min_filesize=1000, max_attempts=3, concurrency=8, prefetch=8, rate_limit=0, negative_cache_ttl=NEGATIVE_CACHE_TTL, verbose=False):
         self.client = client
         self.outdir = outdir
         self.search_timeout = search_timeout
         self.download_timeout = download_timeout
         self.ext = ext
+        self.ext_suffix = f".{ext}"
         self.handled_albums = set()
         self.handled_playlists = set()
         self.min_filesize = min_filesize
         self.max_attempts = max_attempts
         self.verbose = verbose
+        self.concurrency = concurrency
+        self.prefetch = prefetch
+        self.sem = asyncio.Semaphore(concurrency)
+        self.limiter = RateLimiter(rate_limit)
+        self._track_locks = defaultdict(asyncio.Lock)
+        self._result_events: dict[int, asyncio.Event] = {}
+        self._prefetched: dict[str, asyncio.Future] = {}
+        self._prefetch_sem = asyncio.Semaphore(prefetch)
+        self._started: set[str] = set()
+        self.negative_cache_ttl = negative_cache_ttl
+        self._search_cache_path = os.path.join(outdir, SEARCH_CACHE_FILE)
+        self._neg_cache: dict[str, float] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._album_results: dict[str, list] = {}
+        self._peer_sems: dict[str, asyncio.Semaphore] = {}
+        self._out: asyncio.Queue[str] = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_output())
+        client.events.register(SearchResultEvent, self._on_search_result)
+        self._done: dict[str, int] = {}
+
+    async def load_state(self):
+        # Blocking disk reads run in threads so the connected client keeps being serviced
+        if self.negative_cache_ttl <= 0:
+            self._done = await asyncio.to_thread(scan_outdir, self.outdir)
+            return
+        self._done, cache = await asyncio.gather(
+            asyncio.to_thread(scan_outdir, self.outdir),
+            asyncio.to_thread(load_search_cache, self._search_cache_path),
+        )
+        # Entries saved under a longer TTL must not outlive the one asked for now
+        limit = time.time() + self.negative_cache_ttl
+        self._neg_cache = {query: min(expiry, limit) for query, expiry in cache.items()}
+
+    def emit(self, line):
+        self._out.put_nowait(line)
+
+    async def _write_output(self):
+        # Single writer so concurrent tracks don't contend on stdout; lines are flushed in batches
+        while True:
+            lines = [await self._out.get()]
+            while not self._out.empty():
+                lines.append(self._out.get_nowait())
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+
+    async def close(self):
+        self._writer.cancel()
+        if self.negative_cache_ttl > 0:
+            now = time.time()
+            live = {query: expiry for query, expiry in self._neg_cache.items() if expiry > now}
+            try:
+                await asyncio.to_thread(save_search_cache, self._search_cache_path, live)
+            except OSError as e:
+                self.emit(f"⚠️  Could not save search cache: {e}")
+        lines = []
+        while not self._out.empty():
+            lines.append(self._out.get_nowait())
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
 
     def log(self, message):
         if self.verbose:
-            print(message)
+            self.emit(message)
+
+    def _cached_ok(self, track: Track) -> bool:
+        # Pure in-memory lookup; _do_transfer records every file it completes
+        return self._done.get(track.filename, 0) >= self.min_filesize
 
-    def print_result(self, track: Track, success: bool, cached=False):
+    def print_result(self, collection: str, track: Track, success: bool, cached=False):
+        # Collections run concurrently, so each result names the album/playlist it belongs to
         symbol = "📁" if cached else ("✅" if success else "❌")
-        print(f"{symbol} {track.label}")
+        self.emit(f"{symbol} [{collection}] {track.label}")
 
-    async def download_file(self, query, dest):
-        try:
-            search = await self.client.searches.search(query)
-            for _ in range(self.search_timeout):
-                if search.results:
-                    break
-                await asyncio.sleep(1)
-            for peer in sorted(search.results, key=lambda r: r.avg_speed or 0, reverse=True):
-                for item in peer.shared_items:
-                    if not item.filename.lower().endswith(f".{self.ext}"):
-                        continue
-                    try:
-                        transfer = await self.client.transfers.download(peer.username, item.filename)
-                        transfer.local_path = dest
-                        for _ in range(10):
-                            if os.path.exists(dest):
-                                break
-                            await asyncio.sleep(1)
-                        total_wait = 0
-                        while not transfer.is_transfered():
-                            await asyncio.sleep(1)
-                            total_wait += 1
-                            if total_wait > self.download_timeout:
-                                raise TimeoutError("Transfer stalled")
-                        if os.path.getsize(dest) < self.min_filesize:
-                            raise ValueError("File size too small")
-                        return True
-                    except Exception:
-                        continue
-        except Exception:
-            pass
-        return False
+    def _candidates(self, peer):
+        # Files with the wanted extension, paired with their sanitized lowercase basename
+        # Bound to locals since peers can share thousands of files
+        table = _SANITIZE_TABLE
+        basename = ntpath.basename
+        suffix = self.ext_suffix
+        slen = len(suffix)
+        candidates = []
+        append = candidates.append
+        for item in peer.shared_items:
+            fn = item.filename
+            # Only lowercase the short suffix to reject other file types
+            if fn[-slen:].lower() == suffix:
+                # Match on the basename only; folder names (often the album title) would otherwise
+                # make a title track match every file in the folder
+                append((item, basename(fn).lower().translate(table)))
+        return candidates
+
+    async def _on_search_result(self, event: SearchResultEvent):
+        evt = self._result_events.get(event.query.ticket)
+        if evt is not None:
+            evt.set()
+
+    def _album_track_query(self, track: Track) -> str:
+        first_artist = track.artist.partition(',')[0].partition('&')[0].strip()
+        return sanitize(f"{track.album} {first_artist}")
+
+    def _track_query(self, track: Track) -> str:
+        return sanitize(f"{track.name} {track.artist}")
+
+    async def _prefetch_searches(self, tracks: list[Track], issued: list[str]):
+        # Issue the first search for upcoming tracks while earlier ones are still transferring
+        for track in tracks:
+            if track.sid in self._started or self._cached_ok(track):
+                continue
+            query = self._album_track_query(track) if track.album else self._track_query(track)
+            if query in self._prefetched or query in self._inflight or self._known_empty(query):
+                continue
+            await self._prefetch_sem.acquire()
+            # Another playlist's producer may have issued the same query while this one waited
+            if track.sid in self._started or query in self._prefetched or query in self._inflight or self._known_empty(query):
+                self._prefetch_sem.release()
+                continue
+            self._prefetched[query] = asyncio.ensure_future(self._issue_search(query))
+            issued.append(query)
 
-    async def search_album_and_download_track(self, track: Track):
-        dest = os.path.join(self.outdir, f"{track.sid}.{self.ext}")
-        if os.path.exists(dest) and os.path.getsize(dest) >= self.min_filesize:
-            self.print_result(track, True, cached=True)
+    def _known_empty(self, query) -> bool:
+        expiry = self._neg_cache.get(query)
+        if expiry is None:
+            return False
+        if expiry > time.time():
             return True
+        del self._neg_cache[query]
+        return False
 
-        first_artist = track.artist.split(',')[0].split('&')[0].strip()
-        query = sanitize(f"{track.album} {first_artist}")
-        search = await self.client.searches.search(query)
-        for _ in range(self.search_timeout):
-            if search.results:
+    async def _issue_search(self, query):
+        await self.limiter.acquire()
+        return await self.client.searches.search(query)
+
+    async def _search(self, query):
+        # Returns the live result list of the search, which keeps growing as peers answer
+        if self._known_empty(query):
+            self.log(f"🚫 Skipping search with no recent results: {query}")
+            return []
+        # Tracks of the same album ask for the same query; share one search between them
+        task = self._inflight.get(query)
+        if task is None:
+            task = asyncio.ensure_future(self._run_search(query))
+            self._inflight[query] = task
+            task.add_done_callback(lambda _: self._inflight.pop(query, None))
+        return await asyncio.shield(task)
+
+    async def _run_search(self, query):
+        pending = self._prefetched.pop(query, None)
+        if pending is not None:
+            self._prefetch_sem.release()
+            search = await pending
+        else:
+            search = await self._issue_search(query)
+        if not search.results:
+            # Wake up on the first result instead of polling every second
+            evt = asyncio.Event()
+            self._result_events[search.ticket] = evt
+            try:
+                await asyncio.wait_for(evt.wait(), self.search_timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                del self._result_events[search.ticket]
+            if not search.results:
+                self._neg_cache[query] = time.time() + self.negative_cache_ttl
+        return search.results
+
+    async def _await_transfer(self, transfer, dest):
+        loop = asyncio.get_running_loop()
+        # Poll with exponential backoff so short transfers return almost immediately
+        delay = 0.05
+        deadline = loop.time() + 10
+        while not transfer.is_transfered() and loop.time() < deadline:
+            # stat off the event loop so a slow output directory doesn't stall other downloads
+            if await asyncio.to_thread(os.path.exists, dest):
                 break
-            await asyncio.sleep(1)
-
-        for attempt in range(self.max_attempts):
-            found_peer = False
-            for peer in sorted(search.results, key=lambda r: r.avg_speed or 0, reverse=True):
-                for item in peer.shared_items:
-                    if not item.filename.lower().endswith(f".{self.ext}"):
-                        continue
-                    if sanitize(track.name).lower() in sanitize(item.filename).lower():
-                        found_peer = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1)
+        delay = 0.05
+        deadline = loop.time() + self.download_timeout
+        while not transfer.is_transfered():
+            if loop.time() > deadline:
+                raise TimeoutError("Transfer stalled")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1)
+
+    def _fastest_peers(self, results):
+        # Peers with a free transfer slot first, each group fastest first. Yielded lazily from
+        # a heap: heapify is O(n) and most tracks stop after the first peer or two
+        idle, busy = [], []
+        for n, peer in enumerate(results):
+            sem = self._peer_sems.get(peer.username)
+            (busy if sem is not None and sem.locked() else idle).append((-_peer_speed(peer), n, peer))
+        for heap in (idle, busy):
+            heapq.heapify(heap)
+            while heap:
+                yield heapq.heappop(heap)[2]
+
+    async def _do_transfer(self, peer, item, track: Track):
+        sem = self._peer_sems.get(peer.username)
+        if sem is None:
+            sem = self._peer_sems[peer.username] = asyncio.Semaphore(PEER_SLOTS)
+        async with sem:
+            await self.limiter.acquire()
+            transfer = await self.client.transfers.download(peer.username, item.filename)
+            transfer.local_path = track.dest
+            await self._await_transfer(transfer, track.dest)
+        size = (await asyncio.to_thread(os.stat, track.dest)).st_size
+        self._done[track.filename] = size
+        if size < self.min_filesize:
+            raise ValueError("File size too small")
+        return True
+
+    async def download_file(self, query, track: Track):
+        async with self.sem:
+            try:
+                results = await self._search(query)
+                for peer in self._fastest_peers(results):
+                    for item in peer.shared_items:
+                        if item.filename[-len(self.ext_suffix):].lower() != self.ext_suffix:
+                            continue
                         try:
-                            transfer = await self.client.transfers.download(peer.username, item.filename)
-                            transfer.local_path = dest
-                            for _ in range(10):
-                                if os.path.exists(dest):
-                                    break
-                                await asyncio.sleep(1)
-                            total_wait = 0
-                            while not transfer.is_transfered():
-                                await asyncio.sleep(1)
-                                total_wait += 1
-                                if total_wait > self.download_timeout:
-                                    raise TimeoutError("Transfer stalled")
-                            if os.path.getsize(dest) < self.min_filesize:
-                                raise ValueError("File size too small")
-                            self.print_result(track, True)
-                            return True
-                        except Exception as e:
-                            self.log(f"{track.label} ⚠️  Attempt {attempt+1} failed: {type(e).__name__}")
-                            break
-            if not found_peer:
-                self.log(f"{track.label} ⚠️  Attempt {attempt+1} failed: No match")
-            await asyncio.sleep(1)
-        self.print_result(track, False)
-        return False
+                            return await self._do_transfer(peer, item, track)
+                        except DOWNLOAD_ERRORS:
+                            continue
+            except DOWNLOAD_ERRORS:
+                pass
+            return False
+
+    async def search_album_and_download_track(self, track: Track, collection: str):
+        async with self.sem:
+            if self._cached_ok(track):
+                self.print_result(collection, track, True, cached=True)
+                return True
+
+            # Tracks refilled after a partial album reuse that album's search results
+            results = self._album_results.get(track.album)
+            if not results:
+                try:
+                    results = await self._search(self._album_track_query(track))
+                except DOWNLOAD_ERRORS as e:
+                    # A failed album search counts as no results so the individual search still runs
+                    self.log(f"{track.label} ⚠️  Album search failed: {type(e).__name__}")
+                    results = []
+
+            candidates = {}
+            for attempt in range(self.max_attempts):
+                # Results can keep arriving between attempts, so peers are re-ranked each time
+                found_peer = False
+                for peer in self._fastest_peers(results):
+                    if id(peer) not in candidates:
+                        candidates[id(peer)] = self._candidates(peer)
+                    for item, san_fn in candidates[id(peer)]:
+                        if track.sanitized_name_lc in san_fn:
+                            found_peer = True
+                            try:
+                                await self._do_transfer(peer, item, track)
+                                self.print_result(collection, track, True)
+                                return True
+                            except DOWNLOAD_ERRORS as e:
+                                self.log(f"{track.label} ⚠️  Attempt {attempt+1} failed: {type(e).__name__}")
+                                break
+                if not found_peer:
+                    self.log(f"{track.label} ⚠️  Attempt {attempt+1} failed: No match")
+                if attempt + 1 < self.max_attempts:
+                    # Exponential backoff with jitter so concurrent tracks don't retry in lockstep
+                    await asyncio.sleep(min(0.5 * 2 ** attempt, 10) + random.uniform(0, 0.5))
+            self.print_result(collection, track, False)
+            return False
 
     async def download_playlist(self, playlist: str, tracks: list[Track]):
         if playlist in self.handled_playlists:
             return
         self.handled_playlists.add(playlist)
-        print(f"\n🎶 Playlist: {playlist}")  # <-- Always print the playlist name
-        for track in tracks:
-            dest = os.path.join(self.outdir, f"{track.sid}.{self.ext}")
-            if os.path.exists(dest) and os.path.getsize(dest) >= self.min_filesize:
-                self.print_result(track, True, cached=True)
-                continue
+        self.emit(f"\n🎶 Playlist: {playlist}")  # <-- Always print the playlist name
+        issued = []
+        producer = asyncio.create_task(self._prefetch_searches(tracks, issued)) if self.prefetch else None
+        try:
+            await self._download_all(tracks, playlist)
+        finally:
+            if producer is not None:
+                producer.cancel()
+            # Free the slots of prefetched searches that ended up unused
+            for query in issued:
+                if self._prefetched.pop(query, None) is not None:
+                    self._prefetch_sem.release()
+
+    async def _download_all(self, tracks: list[Track], collection: str):
+        # A fixed pool of workers keeps live tasks bounded by concurrency rather than track count
+        pending = iter(tracks)
+
+        async def worker():
+            for track in pending:
+                try:
+                    await self._download_one(track, collection)
+                except Exception as e:
+                    # Last resort: an unexpected error fails this track, not the whole collection
+                    self.log(f"{track.label} ⚠️  {type(e).__name__}")
+                    self.print_result(collection, track, False)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(tracks)))))
+
+    async def _download_one(self, track: Track, collection: str):
+        self._started.add(track.sid)
+        # A track shared by several playlists is only fetched once at a time
+        async with self._track_locks[track.sid]:
+            if self._cached_ok(track):
+                self.print_result(collection, track, True, cached=True)
+                return True
             success = False
             if track.album:
-                success = await self.search_album_and_download_track(track)
+                success = await self.search_album_and_download_track(track, collection)
             if not success:
                 self.log(f"{track.label} 🔁 Falling back to individual track search")
-                query = sanitize(f"{track.name} {track.artist}")
-                success = await self.download_file(query, dest)
-                self.print_result(track, success)
+                success = await self.download_file(self._track_query(track), track)
+                self.print_result(collection, track, success)
+            return success
 
     async def download_album(self, album: str, artist: str, tracks: list[Track]):
         if album in self.handled_albums:
             return
         self.handled_albums.add(album)
-        print(f"\n📀 Album: {album} by {artist}")
+        self.emit(f"\n📀 Album: {album} by {artist}")
         seen = set()
         for track in tracks:
-            dest = os.path.join(self.outdir, f"{track.sid}.{self.ext}")
-            if os.path.exists(dest) and os.path.getsize(dest) >= self.min_filesize:
-                self.print_result(track, True, cached=True)
+            if self._cached_ok(track):
+                self.print_result(album, track, True, cached=True)
                 seen.add(track.sid)
         missing = [t for t in tracks if t.sid not in seen]
         if not missing:
             return
         query = sanitize(f"{album} {artist}")
-        search = await self.client.searches.search(query)
-        for _ in range(self.search_timeout):
-            if search.results:
-                break
-            await asyncio.sleep(1)
-        for peer in sorted(search.results, key=lambda r: r.avg_speed or 0, reverse=True):
-            remaining = [t for t in missing if t.sid not in seen]
-            for item in peer.shared_items:
-                if not item.filename.lower().endswith(f".{self.ext}"):
+        try:
+            results = await self._search(query)
+        except DOWNLOAD_ERRORS as e:
+            # Every missing track is then filled individually below
+            self.log(f"⚠️  Album search failed: {type(e).__name__}")
+            results = []
+        matcher = TrackMatcher(missing)
+        for peer in self._fastest_peers(results):
+            for item, san_fn in self._candidates(peer):
+                track = matcher.match(san_fn, seen)
+                if track is None:
                     continue
-                for track in remaining:
-                    if sanitize(track.name).lower() in sanitize(item.filename).lower():
-                        dest = os.path.join(self.outdir, f"{track.sid}.{self.ext}")
-                        try:
-                            transfer = await self.client.transfers.download(peer.username, item.filename)
-                            transfer.local_path = dest
-                            for _ in range(10):
-                                if os.path.exists(dest):
-                                    break
-                                await asyncio.sleep(1)
-                            total_wait = 0
-                            while not transfer.is_transfered():
-                                await asyncio.sleep(1)
-                                total_wait += 1
-                                if total_wait > self.download_timeout:
-                                    raise TimeoutError("Stalled")
-                            if os.path.getsize(dest) < self.min_filesize:
-                                raise ValueError("File size too small")
-                            self.print_result(track, True)
-                            seen.add(track.sid)
-                        except Exception:
-                            self.print_result(track, False)
+                try:
+                    await self._do_transfer(peer, item, track)
+                    self.print_result(album, track, True)
+                    seen.add(track.sid)
+                except DOWNLOAD_ERRORS:
+                    self.print_result(album, track, False)
+                except Exception as e:
+                    # Last resort: an unexpected error fails this track, not every running album
+                    self.log(f"{track.label} ⚠️  {type(e).__name__}")
+                    self.print_result(album, track, False)
             if len(seen) == len(tracks):
                 return
         self.log("❌ Incomplete album. Filling individually.")
-        for track in tracks:
-            if track.sid not in seen:
-                await self.download_playlist("Incomplete Album Fallback", [track])
+        self._album_results[album] = results
+        try:
+            await self._download_all([t for t in tracks if t.sid not in seen], album)
+        finally:
+            del self._album_results[album]
+
+def load_tracks(path, outdir, ext) -> dict[str, Track]:
+    return {sid: Track(sid, info, outdir, ext) for sid, info in iter_index(path)}
 
-def validate_metadata(tracks, outdir, ext):
+def validate_metadata(tracks):
     print("\n🔎 Validating metadata...")
     for track in tracks:
-        filepath = os.path.join(outdir, f"{track.sid}.{ext}")
-        if not os.path.exists(filepath):
+        if not os.path.exists(track.dest):
             continue
-        audio = MutagenFile(filepath, easy=True)
+        audio = MutagenFile(track.dest, easy=True)
         if not audio:
             print(f"⚠️  Cannot read metadata: {track.label}")
             continue
@@ -246,12 +613,17 @@ async def main():
     parser.add_argument("--ext", default="mp3")
     parser.add_argument("--search-timeout", type=int, default=10)
     parser.add_argument("--download-timeout", type=int, default=60)
+    parser.add_argument("--concurrency", type=positive_int, default=8, help="maximum number of tracks downloading at once")
+    parser.add_argument("--prefetch", type=non_negative_int, default=8, help="number of searches issued ahead of active downloads (0 = disabled)")
+    parser.add_argument("--rate-limit", type=float, default=0, help="maximum searches/transfer requests per second (0 = unlimited)")
+    parser.add_argument("--negative-cache-ttl", type=float, default=NEGATIVE_CACHE_TTL, help="seconds a search with no results is skipped, kept across runs (0 = disabled)")
+    parser.add_argument("--collections", type=positive_int, default=4, help="maximum number of albums/playlists processed at once")
     parser.add_argument("--verbose", action="store_true", help="enable verbose output")
     args = parser.parse_args()
 
     load_dotenv()
     disable_aioslsk_logging()
-    os.makedirs(args.output, exist_ok=True)
+    await asyncio.to_thread(os.makedirs, args.output, exist_ok=True)
 
     creds = CredentialsSettings(
         username=getenv_safe("SOULSEEK_USERNAME"),
@@ -267,35 +639,60 @@ async def main():
         print("❌ Could not connect to SoulSeek")
         sys.exit(1)
 
-    data = {}
-    for path in args.json_files:
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data.update(json.load(f))
-        except Exception as e:
-            print(f"Failed to load {path}: {e}")
+    # Index files are read and parsed in worker threads concurrently. Parsing allocates
+    # millions of acyclic containers, each of which would count towards a GC pass
+    gc.disable()
+    try:
+        loaded = await asyncio.gather(
+            *(asyncio.to_thread(load_tracks, path, args.output, args.ext) for path in args.json_files),
+            return_exceptions=True,
+        )
+    finally:
+        gc.enable()
+    # Later files override earlier ones for the same track, as with dict.update
+    tracks = {}
+    for path, result in zip(args.json_files, loaded):
+        if isinstance(result, Exception):
+            print(f"Failed to load {path}: {result}")
             sys.exit(1)
+        tracks.update(result)
 
-    tracks = [Track(sid, info) for sid, info in data.items()]
     album_map = defaultdict(list)
     playlist_map = defaultdict(list)
-
-    for track in tracks:
+    for track in tracks.values():
         if track.album_source:
             album_map[track.album].append(track)
         for pl in track.playlists:
             playlist_map[pl].append(track)
 
-    dl = Downloader(client, args.output, args.search_timeout, args.download_timeout, args.ext, verbose=args.verbose)
-    for album, album_tracks in album_map.items():
-        await dl.download_album(album, album_tracks[0].artist, album_tracks)
-    for pl, pl_tracks in playlist_map.items():
-        await dl.download_playlist(pl, pl_tracks)
+    dl = Downloader(client, args.output, args.search_timeout, args.download_timeout, args.ext, concurrency=args.concurrency, prefetch=args.prefetch, rate_limit=args.rate_limit, negative_cache_ttl=args.negative_cache_ttl, verbose=args.verbose)
+    await dl.load_state()
+    collection_sem = asyncio.Semaphore(args.collections)
+
+    async def bounded(coro):
+        async with collection_sem:
+            await coro
+
+    try:
+        # Albums still finish before playlists so shared tracks are picked up from disk
+        async with asyncio.TaskGroup() as tg:
+            for album, album_tracks in album_map.items():
+                tg.create_task(bounded(dl.download_album(album, album_tracks[0].artist, album_tracks)))
+        async with asyncio.TaskGroup() as tg:
+            for pl, pl_tracks in playlist_map.items():
+                tg.create_task(bounded(dl.download_playlist(pl, pl_tracks)))
+    finally:
+        # Flush queued output and save the search cache even when a collection failed
+        await dl.close()
 
-    validate_metadata(tracks, args.output, args.ext)
+    # Reading tags is blocking file I/O; keep the loop free for the still-connected client
+    await asyncio.to_thread(validate_metadata, list(tracks.values()))
 
     await client.stop()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
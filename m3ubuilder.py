@@ -2,9 +2,15 @@ import os
 import json
 from collections import defaultdict
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Load track index
-with open("track_index.json", "r", encoding="utf-8") as f:
-    track_index = json.load(f)
+with open("track_index.json", "rb") as f:
+    raw = f.read()
+track_index = orjson.loads(raw) if orjson is not None else json.loads(raw)
 
 # Output directories
 PLAYLIST_DIR = "Playlists"
@@ -31,9 +37,7 @@ for track_id, info in track_index.items():
 # Helper to write M3U
 def write_m3u(filename, tracks):
     with open(filename, "w", encoding="utf-8") as f:
-        f.write("#EXTM3U\n")
-        for track in tracks:
-            f.write(track + "\n")
+        f.write("#EXTM3U\n" + "".join(track + "\n" for track in tracks))
 
 # Write playlist M3Us
 for name, tracks in playlists.items():
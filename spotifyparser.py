@@ -1,9 +1,18 @@
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Load environment variables
 load_dotenv()
 
@@ -12,6 +21,28 @@ CLIENT_ID = os.getenv("CLIENT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 REDIRECT_URI = 'http://127.0.0.1:8888/callback'
 SCOPE = 'user-library-read playlist-read-private'
+MAX_WORKERS = 20 # concurrent Spotify API requests
+
+# HTTP session sized for both thread pools (album fan-out and page fetches can be busy
+# at once); spotipy's default adapter keeps only 10 connections per host, so extra
+# workers would reconnect on every request.
+# Same retry policy as spotipy's own session (429 honours Retry-After)
+session = requests.Session()
+adapter = HTTPAdapter(
+    pool_connections=2 * MAX_WORKERS,
+    pool_maxsize=2 * MAX_WORKERS,
+    max_retries=Retry(
+        total=3,
+        connect=None,
+        read=False,
+        status=3,
+        backoff_factor=0.3,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status_forcelist=(429, 500, 502, 503, 504),
+    ),
+)
+session.mount("https://", adapter)
+session.mount("http://", adapter)
 
 # Spotify authentication
 sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
@@ -19,84 +50,110 @@ sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
     client_secret=CLIENT_SECRET,
     redirect_uri=REDIRECT_URI,
     scope=SCOPE
-))
+), requests_session=session)
+
+# Shared by every paginated fetch; album-level fan-out uses its own pool so the two never wait on each other
+page_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
 
 # Load or initialize track index
 track_index_path = "track_index.json"
 if os.path.exists(track_index_path):
-    with open(track_index_path, "r", encoding="utf-8") as f:
-        track_index = json.load(f)
+    with open(track_index_path, "rb") as f:
+        raw = f.read()
+    track_index = orjson.loads(raw) if orjson is not None else json.loads(raw)
 else:
     track_index = {}
 
+# (type, name) pairs already linked to each track, built on first use so dedup is a set lookup
+source_keys = {}
+# Track ids added or given a new source this run; nothing is written when it stays empty
+dirty = set()
+
+def source_key(source):
+    return (source.get("type"), source.get("playlist_name", source.get("album_name")))
+
+def add_source(track_id, source):
+    keys = source_keys.get(track_id)
+    if keys is None:
+        keys = source_keys[track_id] = {source_key(s) for s in track_index[track_id]["sources"]}
+    key = source_key(source)
+    if key not in keys:
+        keys.add(key)
+        track_index[track_id]["sources"].append(source)
+        dirty.add(track_id)
+
+# Fetch every page of a paged endpoint: the first page gives 'total' and 'limit',
+# the remaining offsets are then requested concurrently and kept in order.
+# Rate limiting (429 + Retry-After) is retried by the shared HTTP session.
+def fetch_all_pages(fetch_page):
+    first = fetch_page(offset=0)
+    items = list(first.get('items', []))
+    limit = first.get('limit') or len(items)
+    if not first.get('next') or not limit:
+        return items
+    offsets = range(limit, first.get('total', 0), limit)
+    for page in page_pool.map(lambda offset: fetch_page(offset=offset, limit=limit), offsets):
+        items.extend(page.get('items', []))
+    return items
+
 # Function for handling playlists
 def process_playlist_tracks(playlist_id, playlist_name):
-    tracks = sp.playlist_tracks(playlist_id)
-    while tracks:
-        for item in tracks.get('items', []):
-            track = item.get('track')
-            if not track or not track.get('id'):
-                continue
-
-            track_id = track['id']
-            track_name = track.get('name', 'Unknown Track')
-            track_artist = ", ".join(a.get('name', '') for a in track.get('artists', []) if a.get('name'))
-            album_name = track.get('album', {}).get('name', 'Unknown Album') # album 'title' sounds better, but spotify calls this the 'name'
-
-            if track_id not in track_index:
-                track_index[track_id] = {
-                    "name": track_name,
-                    "artist": track_artist,
-                    "album": album_name,
-                    "sources": []
-                }
-
-            # Add playlist source if not already linked
-            if not any(s.get("type") == "playlist" and s.get("playlist_name") == playlist_name for s in track_index[track_id]["sources"]):
-                track_index[track_id]["sources"].append({
-                    "type": "playlist",
-                    "playlist_name": playlist_name
-                })
-
-        tracks = sp.next(tracks) if tracks.get('next') else None
+    for item in fetch_all_pages(lambda **page: sp.playlist_tracks(playlist_id, **page)):
+        track = item.get('track')
+        if not track or not track.get('id'):
+            continue
+
+        track_id = track['id']
+        track_name = track.get('name', 'Unknown Track')
+        track_artist = ", ".join([name for a in track.get('artists') or () if (name := a.get('name'))])
+        album_name = (track.get('album') or {}).get('name', 'Unknown Album') # album 'title' sounds better, but spotify calls this the 'name'
+
+        if track_id not in track_index:
+            track_index[track_id] = {
+                "name": track_name,
+                "artist": track_artist,
+                "album": album_name,
+                "sources": []
+            }
+
+        # Add playlist source if not already linked
+        add_source(track_id, {
+            "type": "playlist",
+            "playlist_name": playlist_name
+        })
+
+# Fetch every track page of an album (runs in worker threads)
+def fetch_album_tracks(album_id):
+    return fetch_all_pages(lambda **page: sp.album_tracks(album_id, **page))
 
 # Function for handling albums
-def process_album_tracks(album_id, album_name):
-    tracks = sp.album_tracks(album_id)
-    while tracks:
-        for track in tracks.get('items', []):
-            track_id = track.get('id')
-            if not track_id:
-                continue
-            track_name = track.get('name', 'Unknown Track')
-            track_artist = ", ".join(a.get('name', '') for a in track.get('artists', []) if a.get('name'))
-
-            if track_id not in track_index:
-                track_index[track_id] = {
-                    "name": track_name,
-                    "artist": track_artist,
-                    "album": album_name,
-                    "sources": []
-                }
-
-            # Add album source if not already linked
-            if not any(s.get("type") == "album" and s.get("album_name") == album_name for s in track_index[track_id]["sources"]):
-                track_index[track_id]["sources"].append({
-                    "type": "album",
-                    "album_name": album_name
-                })
-
-        tracks = sp.next(tracks) if tracks.get('next') else None
+def process_album_tracks(album_name, items):
+    for track in items:
+        track_id = track.get('id')
+        if not track_id:
+            continue
+        track_name = track.get('name', 'Unknown Track')
+        track_artist = ", ".join([name for a in track.get('artists') or () if (name := a.get('name'))])
+
+        if track_id not in track_index:
+            track_index[track_id] = {
+                "name": track_name,
+                "artist": track_artist,
+                "album": album_name,
+                "sources": []
+            }
+
+        # Add album source if not already linked
+        add_source(track_id, {
+            "type": "album",
+            "album_name": album_name
+        })
 
 #                            #
 # --- Playlist selection --- #
 #                            #
 
-playlist_items = []
-results = sp.current_user_playlists()
-while results:
-    playlist_items.extend(results.get('items', []))
-    results = sp.next(results) if results and results.get('next') else None
+playlist_items = fetch_all_pages(sp.current_user_playlists)
 
 print("\nPlaylists:")
 for i, playlist in enumerate(playlist_items):
@@ -135,11 +192,7 @@ for playlist in selected_playlists:
 # --- Album selection --- #
 #                         #
 
-album_items = []
-results = sp.current_user_saved_albums()
-while results:
-    album_items.extend(results.get('items', []))
-    results = sp.next(results) if results and results.get('next') else None
+album_items = fetch_all_pages(sp.current_user_saved_albums)
 
 print("\nAlbums:")
 for i, item in enumerate(album_items):
@@ -169,19 +222,37 @@ else:
     selected_albums = [p for i, p in enumerate(album_items) if i in selected_indices]
 
 
+albums_to_fetch = []
 for item in selected_albums:
     album = item.get('album')
     if not album:
         print("Warning: album data missing for selected item, skipping.")
         continue
-    aid = album.get('id')
-    aname = album.get('name', 'Unknown Album')
-    print(f"\nProcessing album: {aname}")
-    if aid:
-        process_album_tracks(aid, aname)
+    albums_to_fetch.append((album.get('id'), album.get('name', 'Unknown Album')))
+
+# Fetch album tracks concurrently, then merge them into the index in selection order
+with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+    fetched = pool.map(lambda a: fetch_album_tracks(a[0]) if a[0] else [], albums_to_fetch)
+    for (aid, aname), items in zip(albums_to_fetch, fetched):
+        print(f"\nProcessing album: {aname}")
+        process_album_tracks(aname, items)
+page_pool.shutdown()
 
-# Save updated track index once at the end
-with open(track_index_path, "w", encoding="utf-8") as f:
-    json.dump(track_index, f, indent=2, ensure_ascii=False)
+if not dirty:
+    print("\nNo new tracks or sources, track_index.json left unchanged.")
+    raise SystemExit
+
+# Save updated track index once at the end, one track per line so only a single
+# record is serialized in memory at a time; the file is still one plain JSON object
+if orjson is not None:
+    dumps = orjson.dumps
+else:
+    dumps = lambda obj: json.dumps(obj, ensure_ascii=False).encode("utf-8")
+with open(track_index_path, "wb") as f:
+    f.write(b"{")
+    for n, (track_id, entry) in enumerate(track_index.items()):
+        f.write(b",\n" if n else b"\n")
+        f.write(dumps(track_id) + b": " + dumps(entry))
+    f.write(b"\n}\n")
 
-print("\nUpdated track_index.json with selected playlists and albums.")
\ No newline at end of file
+print(f"\nUpdated track_index.json with selected playlists and albums ({len(dirty)} tracks changed).")
\ No newline at end of file